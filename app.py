@@ -1,28 +1,39 @@
+import os
+
+# Tesseract's OpenMP threading only adds overhead on single receipts; must be set before
+# the first OCR call spins up libgomp's thread pool.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
 import streamlit as st
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from pathlib import Path
 
 from src.workspace import workspace_dir
 from src.storage import (
     add_txn,
     list_txns,
+    store_version,
     update_txn,
+    update_txns,
     soft_delete_txn,
+    soft_delete_txns,
     undo_delete_txn,
     purge_deleted_txn,
     build_accountant_pack,
     build_monthly_pnl_csv,
+    OCR_CACHE_DIR,
+    NEEDS_REVIEW_MIN_CONFIDENCE,
 )
 from src.memory import (
     load_memory,
+    memory_version,
     save_memory,
     remember_vendor_mapping,
     remember_job,
     get_known_jobs,
 )
-from src.ocr import ocr_upload
-from src.parse import extract_fields
-from src.categorize import categorize
 
 
 st.set_page_config(page_title="BookIQ", page_icon="🧾", layout="wide")
@@ -42,10 +53,13 @@ COA = {
     "Permits / Fees": ("6800", "Permits & Fees"),
     "Other": ("6999", "Other"),
 }
+COA_KEYS = list(COA.keys())
+COA_INDEX = {k: i for i, k in enumerate(COA_KEYS)}
+COA_OTHER = COA["Other"]
 
 
 def coa_for_category(cat: str):
-    return COA.get(cat, COA["Other"])
+    return COA.get(cat, COA_OTHER)
 
 
 def _utc_now() -> str:
@@ -53,12 +67,13 @@ def _utc_now() -> str:
 
 
 def _needs_review(vendor: str, date: str, amount: float, confidence: float) -> int:
-    vendor_ok = bool((vendor or "").strip())
-    date_ok = bool((date or "").strip())
-    amt_ok = float(amount or 0) > 0
-    if not (vendor_ok and date_ok and amt_ok):
+    if float(amount or 0) <= 0:
+        return 1
+    if float(confidence or 0) < NEEDS_REVIEW_MIN_CONFIDENCE:
         return 1
-    if float(confidence or 0) < 0.72:
+    if not vendor or vendor.isspace():
+        return 1
+    if not date or date.isspace():
         return 1
     return 0
 
@@ -70,8 +85,19 @@ def _safe_float(x, default=0.0) -> float:
         return float(default)
 
 
+REVIEW_PAGE_SIZE = 10
+
+# Number formatting is done client-side by the grid; amounts stay float64 so cents are exact
+TABLE_COLUMN_CONFIG = {
+    "amount": st.column_config.NumberColumn(format="$%.2f"),
+    "confidence": st.column_config.NumberColumn(format="%.2f"),
+}
+
+
 def _make_df(rows):
-    df = pd.DataFrame(rows or [])
+    rows = rows or []
+    # storage backfills every row to the same key set
+    df = pd.DataFrame.from_records(rows, columns=list(rows[0].keys()) if rows else None)
     defaults = {
         "id": "",
         "date": "",
@@ -94,11 +120,18 @@ def _make_df(rows):
     df["amount"] = pd.to_numeric(df["amount"], errors="coerce").fillna(0.0)
     df["confidence"] = pd.to_numeric(df["confidence"], errors="coerce").fillna(0.0)
     df["needs_review"] = pd.to_numeric(df["needs_review"], errors="coerce").fillna(0).astype(int)
+    # Integer cents for exact amount matching; amount stays float for display/sums
+    df["cents"] = (df["amount"] * 100).round().astype("int64")
     df["date"] = df["date"].fillna("").astype(str)
     df["vendor"] = df["vendor"].fillna("").astype(str)
     df["category"] = df["category"].fillna("Other").astype(str)
     df["job"] = df["job"].fillna("").astype(str)
     df["notes"] = df["notes"].fillna("").astype(str)
+    df["account_code"] = df["account_code"].fillna("").astype(str)
+    for col in ("vendor", "category", "job", "account_code"):
+        df[col] = df[col].astype("category")
+    # YYYY-MM, sliced once here for the dashboard metric/trend and the Reports P&L
+    df["month"] = df["date"].str.slice(0, 7).where(df["date"] != "", "unknown").astype("category")
     return df
 
 
@@ -110,12 +143,89 @@ def _duplicate_hint(df: pd.DataFrame, vendor: str, date: str, amount: float) ->
     a = float(amount or 0.0)
     if not v or not d or a <= 0:
         return pd.DataFrame()
-    tmp = df.copy()
-    tmp["_v"] = tmp["vendor"].fillna("").astype(str).str.strip().str.lower()
-    tmp["_d"] = tmp["date"].fillna("").astype(str).str.strip()
-    tmp["_a"] = pd.to_numeric(tmp["amount"], errors="coerce").fillna(0.0)
-    dup = tmp[(tmp["_v"] == v) & (tmp["_d"] == d) & (tmp["_a"].sub(a).abs() <= 0.01)]
-    return dup[["id", "date", "vendor", "amount", "category", "job"]].head(10)
+    mask = (
+        (df["vendor"].str.strip().str.lower() == v)
+        & (df["date"].str.strip() == d)
+        & (df["cents"] == round(a * 100))
+    )
+    return df.loc[mask, ["id", "date", "vendor", "amount", "category", "job"]].head(10)
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _upload_pipeline(ws_code: str, digest: str, filename: str, _file_bytes: bytes):
+    """
+    OCR + field extraction for one upload, memoized on the content digest (not the raw
+    bytes, so Streamlit doesn't re-hash the upload each call). filename is part of the
+    key because .pdf vs image takes a different path.
+    """
+    from src.ocr import make_preview, ocr_upload_cached
+    from src.parse import extract_fields
+
+    cache_dir = workspace_dir(ws_code) / OCR_CACHE_DIR
+    img, raw_text = ocr_upload_cached(filename, _file_bytes, cache_dir, digest=digest)
+    fields = extract_fields(raw_text) if raw_text else {"vendor": "", "date": "", "amount": 0.0}
+
+    # Only a small JPEG thumbnail is kept; full-res is sent from the original bytes on demand
+    preview = make_preview(img) if img is not None else None
+    return preview, raw_text, fields
+
+
+@st.cache_data(show_spinner=False, max_entries=512)
+def _receipt_thumb(path: str, mtime_ns: int):
+    # mtime is in the key so a replaced file is re-rendered
+    from src.ocr import preview_from_file
+
+    return preview_from_file(Path(path))
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _load_rows(ws_code: str, version, include_deleted: bool = False, only_deleted: bool = False):
+    # version = store_version(...): any write to the store changes it, so reruns reuse the parsed rows
+    return list_txns(workspace_dir(ws_code), include_deleted=include_deleted, only_deleted=only_deleted)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _load_df(ws_code: str, version, include_deleted: bool = False, only_deleted: bool = False):
+    return _make_df(_load_rows(ws_code, version, include_deleted=include_deleted, only_deleted=only_deleted))
+
+
+@st.cache_data(show_spinner=False, max_entries=512)
+def _categorize_cached(ws_code: str, digest: str, vendor: str, mem_version: int, _raw_text: str, _memory: dict):
+    # digest stands in for the OCR text; mem_version changes when a vendor mapping is learned
+    from src.categorize import categorize
+
+    return categorize(_raw_text, vendor=vendor, memory=_memory)
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _dashboard_aggs(ws_code: str, version, this_month: str, _df: pd.DataFrame):
+    totals = (
+        float(_df["amount"].sum()),
+        float(_df.loc[_df["month"] == this_month, "amount"].sum()),
+        int(_df["needs_review"].sum()),
+        int(len(_df)),
+    )
+    cat = (
+        _df.groupby("category", dropna=False, observed=True)["amount"]
+        .sum()
+        .sort_values(ascending=False)
+        .reset_index()
+    )
+    vend = (
+        _df.groupby("vendor", dropna=False, observed=True)["amount"]
+        .sum()
+        .sort_values(ascending=False)
+        .reset_index()
+    )
+    vend = vend[vend["vendor"].astype(str).str.strip() != ""].head(12)
+    trend = _df.groupby("month", observed=True)["amount"].sum().sort_index()
+    return cat, vend, trend, totals
+
+
+def _pack_download_buttons() -> None:
+    csv_bytes, zip_buf = build_accountant_pack(WS_DIR)
+    st.download_button("Download CSV", data=csv_bytes, file_name="bookiq_export.csv", mime="text/csv")
+    st.download_button("Download Receipts ZIP", data=zip_buf.getvalue(), file_name="receipts.zip", mime="application/zip")
 
 
 # -------------------------
@@ -189,10 +299,15 @@ if not st.session_state.get("ws_code"):
     st.stop()
 
 WS_DIR = workspace_dir(st.session_state["ws_code"])
-MEM = load_memory(WS_DIR)
+# memory.json is re-parsed only when the workspace or the file's mtime changes (save_memory bumps it)
+_mem_key = (st.session_state["ws_code"], memory_version(WS_DIR))
+if st.session_state.get("_mem_key") != _mem_key:
+    st.session_state["_mem"] = load_memory(WS_DIR)
+    st.session_state["_mem_key"] = _mem_key
+MEM = st.session_state["_mem"]
+JOB_OPTIONS = [""] + get_known_jobs(MEM)
 
-ROWS = list_txns(WS_DIR, include_deleted=False)
-DF = _make_df(ROWS)
+DF = _load_df(st.session_state["ws_code"], store_version(WS_DIR))
 
 st.title("BookIQ")
 st.caption("Simple, accountant-friendly receipt capture for small businesses.")
@@ -213,10 +328,9 @@ with tab_dash:
         today = datetime.utcnow().strftime("%Y-%m-%d")
         this_month = today[:7]
 
-        total_spend = float(DF["amount"].sum())
-        month_spend = float(DF[DF["date"].astype(str).str.startswith(this_month)]["amount"].sum())
-        needs_review_ct = int(DF["needs_review"].sum())
-        receipt_ct = int(len(DF))
+        cat, vend, trend, (total_spend, month_spend, needs_review_ct, receipt_ct) = _dashboard_aggs(
+            st.session_state["ws_code"], store_version(WS_DIR), this_month, DF
+        )
 
         # Money saved calcs
         hourly_rate = float(st.session_state.get("hourly_rate", DEFAULT_HOURLY_RATE))
@@ -249,30 +363,14 @@ with tab_dash:
 
         with left:
             st.subheader("Top categories (all time)")
-            cat = (
-                DF.groupby("category", dropna=False)["amount"]
-                .sum()
-                .sort_values(ascending=False)
-                .reset_index()
-            )
-            st.dataframe(cat, use_container_width=True, hide_index=True)
+            st.dataframe(cat, use_container_width=True, hide_index=True, column_config=TABLE_COLUMN_CONFIG)
 
             st.subheader("Spend over time")
-            tmp = DF.copy()
-            tmp["month"] = tmp["date"].astype(str).str.slice(0, 7)
-            trend = tmp.groupby("month")["amount"].sum().sort_index()
             st.line_chart(trend, height=240)
 
         with right:
             st.subheader("Top vendors (all time)")
-            vend = (
-                DF.groupby("vendor", dropna=False)["amount"]
-                .sum()
-                .sort_values(ascending=False)
-                .reset_index()
-            )
-            vend = vend[vend["vendor"].astype(str).str.strip() != ""].head(12)
-            st.dataframe(vend, use_container_width=True, hide_index=True)
+            st.dataframe(vend, use_container_width=True, hide_index=True, column_config=TABLE_COLUMN_CONFIG)
 
             st.subheader("Quick actions")
             qa1, qa2 = st.columns(2)
@@ -282,9 +380,7 @@ with tab_dash:
                     st.rerun()
             with qa2:
                 if st.button("Build Accountant Pack"):
-                    csv_bytes, zip_bytes = build_accountant_pack(WS_DIR)
-                    st.download_button("Download CSV", data=csv_bytes, file_name="bookiq_export.csv", mime="text/csv")
-                    st.download_button("Download Receipts ZIP", data=zip_bytes, file_name="receipts.zip", mime="application/zip")
+                    _pack_download_buttons()
 
 # ==========================================================
 # 1) UPLOAD
@@ -298,25 +394,33 @@ with tab_upload:
     if up is None:
         st.info("Upload a file to begin.")
     else:
+        # Pillow + pytesseract are only needed once a file is actually uploaded
+        from src.ocr import file_digest
+
         file_bytes = up.getvalue()
 
-        key = f"ocr::{up.name}::{len(file_bytes)}"
-        if st.session_state.get("ocr_key") != key:
-            preview_img, raw_text = ocr_upload(up.name, file_bytes)
+        # file_id is unique per upload, so reruns of the same upload skip even the digest
+        key = f"ocr::{up.file_id}"
+        if st.session_state.get("ocr_key") != key or "ocr_digest" not in st.session_state:
+            digest = file_digest(file_bytes)
+            preview, raw_text, fields = _upload_pipeline(st.session_state["ws_code"], digest, up.name, file_bytes)
             st.session_state["ocr_key"] = key
-            st.session_state["preview_img"] = preview_img
+            st.session_state["ocr_digest"] = digest
+            st.session_state["preview"] = preview
             st.session_state["raw_text"] = raw_text
+            st.session_state["fields"] = fields
 
-        preview_img = st.session_state.get("preview_img")
+        preview = st.session_state.get("preview")
         raw_text = st.session_state.get("raw_text") or ""
-
-        fields = extract_fields(raw_text) if raw_text else {"vendor": "", "date": "", "amount": 0.0}
+        fields = st.session_state.get("fields") or {"vendor": "", "date": "", "amount": 0.0}
 
         vendor0 = (fields.get("vendor") or "").strip()
         date0 = (fields.get("date") or "").strip()
         amount0 = _safe_float(fields.get("amount"), 0.0)
 
-        suggestion = categorize(raw_text, vendor=vendor0, memory=MEM) if raw_text else {"category": "Other", "confidence": 0.0, "reasons": []}
+        suggestion = _categorize_cached(
+            st.session_state["ws_code"], st.session_state["ocr_digest"], vendor0, memory_version(WS_DIR), raw_text, MEM
+        ) if raw_text else {"category": "Other", "confidence": 0.0, "reasons": []}
         category0 = suggestion.get("category", "Other")
         confidence0 = _safe_float(suggestion.get("confidence"), 0.35)
         reasons0 = suggestion.get("reasons", [])
@@ -325,8 +429,10 @@ with tab_upload:
 
         with colA:
             st.subheader("Preview")
-            if preview_img is not None:
-                st.image(preview_img, use_container_width=True)
+            if preview is not None:
+                st.image(preview, use_container_width=True)
+                if st.toggle("Full-resolution preview", value=False):
+                    st.image(file_bytes, use_container_width=True)
             with st.expander("OCR text (debug)"):
                 st.code(raw_text if raw_text else "(No OCR text extracted)")
             with st.expander("Parse diagnostics"):
@@ -349,10 +455,9 @@ with tab_upload:
             dup = _duplicate_hint(DF, vendor, date, amount)
             if not dup.empty:
                 st.warning("⚠️ Possible duplicate detected (same vendor/date/amount).")
-                st.dataframe(dup, use_container_width=True, hide_index=True)
+                st.dataframe(dup, use_container_width=True, hide_index=True, column_config=TABLE_COLUMN_CONFIG)
 
-            known_jobs = get_known_jobs(MEM)
-            job_pick = st.selectbox("Job (optional)", [""] + known_jobs, index=0)
+            job_pick = st.selectbox("Job (optional)", JOB_OPTIONS, index=0)
             if job_pick == "":
                 job = st.text_input("Or type a new job", value="", placeholder="Job #1042 / Smith Backyard")
             else:
@@ -362,8 +467,8 @@ with tab_upload:
 
             category = st.selectbox(
                 "Category",
-                options=list(COA.keys()),
-                index=list(COA.keys()).index(category0) if category0 in COA else list(COA.keys()).index("Other"),
+                options=COA_KEYS,
+                index=COA_INDEX.get(category0, COA_INDEX["Other"]),
             )
             account_code, account_name = coa_for_category(category)
             st.caption(f"Account: **{account_code} — {account_name}**")
@@ -378,6 +483,7 @@ with tab_upload:
                 st.info("This will be marked **Needs review** until required fields are filled and/or confidence improves.")
 
             if st.button("Save receipt", type="primary"):
+                up.seek(0)
                 add_txn(
                     WS_DIR,
                     date=date,
@@ -389,25 +495,11 @@ with tab_upload:
                     confidence_notes="; ".join(reasons0) if isinstance(reasons0, list) else str(reasons0),
                     job=job,
                     notes=notes,
-                    receipt_bytes=file_bytes,
+                    receipt_bytes=up,
                     receipt_filename=up.name,
+                    needs_review=int(needs_review_flag),
                 )
 
-                try:
-                    latest = list_txns(WS_DIR, include_deleted=False)
-                    if latest:
-                        last = latest[-1]
-                        update_txn(
-                            WS_DIR,
-                            last["id"],
-                            {
-                                "needs_review": needs_review_flag,
-                                "updated_at": _utc_now(),
-                            },
-                        )
-                except Exception:
-                    pass
-
                 if job:
                     remember_job(MEM, job)
                 remember_vendor_mapping(MEM, vendor=vendor, category=category, account_code=account_code)
@@ -416,15 +508,163 @@ with tab_upload:
                 st.success("Saved ✅")
                 st.rerun()
 
+
+REVIEW_CARD_FIELDS = ["id", "date", "vendor", "amount", "category", "account_code", "job", "notes", "confidence", "receipt_path"]
+
+
+def _review_card(r) -> None:
+    # A form per card: typing/picking in a card doesn't rerun anything; only Approve/Delete
+    # submit, and those rerun the app so the list, counts and other tabs pick up the change.
+    with st.form(f"review_{r.id}", border=True):
+        c1, c2, c3 = st.columns([2, 2, 1])
+
+        with c1:
+            st.markdown(f"**{r.vendor or '(missing vendor)'}**")
+            st.caption(f"ID: {r.id} • Confidence: {r.confidence:.2f}")
+            st.write(f"Date: `{r.date}`  |  Amount: **${r.amount:.2f}**")
+            st.write(f"Category: `{r.category}`  |  Account: `{r.account_code}`")
+
+            receipt_path = r.receipt_path.strip()
+            p = WS_DIR / receipt_path if receipt_path else None
+            if p and p.exists():
+                with st.expander("Show receipt image"):
+                    thumb = _receipt_thumb(str(p), p.stat().st_mtime_ns)
+                    if thumb is not None:
+                        st.image(thumb, use_container_width=True)
+                    else:
+                        st.caption("No preview for this file type.")
+
+        with c2:
+            new_vendor = st.text_input("Vendor", value=r.vendor, key=f"rv_{r.id}")
+            new_date = st.text_input("Date", value=r.date, key=f"rd_{r.id}")
+            new_amount = st.number_input(
+                "Amount",
+                min_value=0.0,
+                value=float(r.amount),
+                step=0.01,
+                key=f"ra_{r.id}",
+            )
+
+            new_cat = st.selectbox(
+                "Category",
+                options=COA_KEYS,
+                index=COA_INDEX.get(r.category, COA_INDEX["Other"]),
+                key=f"rc_{r.id}",
+            )
+            code, _ = coa_for_category(new_cat)
+
+            # form widgets only report on submit, so both job inputs are always shown
+            new_job_pick = st.selectbox("Job", JOB_OPTIONS, index=0, key=f"rjpick_{r.id}")
+            new_job_typed = st.text_input("Or type job", value=r.job, key=f"rj_{r.id}")
+            new_job = new_job_pick or new_job_typed
+
+            new_notes = st.text_input("Notes", value=r.notes, key=f"rn_{r.id}")
+
+        with c3:
+            if st.form_submit_button("Approve", type="primary"):
+                update_txn(
+                    WS_DIR,
+                    r.id,
+                    {
+                        "vendor": new_vendor,
+                        "date": new_date,
+                        "amount": float(new_amount),
+                        "category": new_cat,
+                        "account_code": code,
+                        "job": new_job,
+                        "notes": new_notes,
+                        "approved_at": _utc_now(),
+                        "confidence": max(float(r.confidence), 0.90),
+                        "needs_review": 0,
+                        "updated_at": _utc_now(),
+                    },
+                )
+
+                if new_job:
+                    remember_job(MEM, new_job)
+                remember_vendor_mapping(MEM, vendor=new_vendor, category=new_cat, account_code=code)
+                save_memory(WS_DIR, MEM)
+
+                st.success("Approved ✅")
+                st.rerun()
+
+            if st.form_submit_button("Delete"):
+                soft_delete_txn(WS_DIR, r.id)
+                st.warning("Moved to Recently deleted 🗑️")
+                st.rerun()
+
+
+REVIEW_GRID_FIELDS = ["date", "vendor", "amount", "category", "job", "notes"]
+
+
+def _review_grid(review: pd.DataFrame) -> None:
+    # plain strings in the grid: edits may introduce values outside the categorical's categories
+    base = review[["id"] + REVIEW_GRID_FIELDS + ["confidence"]].astype(
+        {"vendor": str, "category": str, "job": str}
+    ).reset_index(drop=True)
+    base.insert(0, "approve", False)
+
+    edited = st.data_editor(
+        base,
+        # the store version is in the key so pending edits reset once a save lands
+        key=f"review_grid_{store_version(WS_DIR)}",
+        num_rows="fixed",
+        hide_index=True,
+        use_container_width=True,
+        disabled=["id", "confidence"],
+        column_config={
+            "approve": st.column_config.CheckboxColumn("Approve"),
+            "amount": st.column_config.NumberColumn(format="$%.2f", min_value=0.0, step=0.01),
+            "category": st.column_config.SelectboxColumn(options=COA_KEYS, required=True),
+            "confidence": st.column_config.NumberColumn(format="%.2f"),
+        },
+    )
+
+    if st.button("Save changes", type="primary", key="review_grid_save"):
+        # cleared cells come back as None/NaN
+        edited = edited.fillna({"date": "", "vendor": "", "job": "", "notes": "", "amount": 0.0})
+        # Only rows that were edited or ticked get written
+        changed = (edited[REVIEW_GRID_FIELDS] != base[REVIEW_GRID_FIELDS]).any(axis=1) | edited["approve"]
+        learned = False
+        updates = {}
+        for r in edited[changed].to_dict(orient="records"):
+            code, _ = coa_for_category(r["category"])
+            conf = _safe_float(r.get("confidence"), 0.0)
+            patch = {
+                "vendor": r["vendor"],
+                "date": r["date"],
+                "amount": _safe_float(r["amount"], 0.0),
+                "category": r["category"],
+                "account_code": code,
+                "job": r["job"],
+                "notes": r["notes"],
+                "updated_at": _utc_now(),
+            }
+            if r["approve"]:
+                patch.update({"approved_at": _utc_now(), "confidence": max(conf, 0.90), "needs_review": 0})
+                if r["job"]:
+                    remember_job(MEM, r["job"])
+                remember_vendor_mapping(MEM, vendor=r["vendor"], category=r["category"], account_code=code)
+                learned = True
+            else:
+                patch["needs_review"] = _needs_review(r["vendor"], r["date"], patch["amount"], conf)
+            updates[r["id"]] = patch
+        update_txns(WS_DIR, updates)
+
+        if learned:
+            save_memory(WS_DIR, MEM)
+        st.success(f"Saved {int(changed.sum())} ✅")
+        st.rerun()
+
+
 # ==========================================================
 # 2) NEEDS REVIEW
 # ==========================================================
 with tab_review:
     st.header("Needs review")
 
-    rows = list_txns(WS_DIR, include_deleted=False)
-    df = _make_df(rows)
-    review = df[df["needs_review"] == 1].copy()
+    df = DF
+    review = df[df["needs_review"] == 1]
 
     if review.empty:
         st.success("Nothing needs review 🎉")
@@ -437,104 +677,58 @@ with tab_review:
         b1, b2, b3 = st.columns([1, 1, 1])
         with b1:
             if st.button("Bulk approve selected", type="primary") and bulk_ids:
-                for _id in bulk_ids:
-                    update_txn(WS_DIR, _id, {"needs_review": 0, "approved_at": _utc_now(), "updated_at": _utc_now()})
+                now = _utc_now()
+                update_txns(WS_DIR, {_id: {"needs_review": 0, "approved_at": now, "updated_at": now} for _id in bulk_ids})
                 st.success(f"Approved {len(bulk_ids)} ✅")
                 st.rerun()
         with b2:
             if st.button("Bulk delete selected") and bulk_ids:
-                for _id in bulk_ids:
-                    soft_delete_txn(WS_DIR, _id)
+                soft_delete_txns(WS_DIR, bulk_ids)
                 st.warning(f"Moved {len(bulk_ids)} to Recently deleted 🗑️")
                 st.rerun()
         with b3:
             if st.button("Recompute needs_review for ALL"):
-                for r in rows:
-                    nr = _needs_review(r.get("vendor", ""), r.get("date", ""), _safe_float(r.get("amount"), 0.0), _safe_float(r.get("confidence"), 0.0))
-                    update_txn(WS_DIR, r["id"], {"needs_review": nr, "updated_at": _utc_now()})
+                # only rows whose flag flips are written
+                nr = (
+                    (df["amount"] <= 0)
+                    | (df["confidence"] < NEEDS_REVIEW_MIN_CONFIDENCE)
+                    | (df["vendor"].str.strip() == "")
+                    | (df["date"].str.strip() == "")
+                ).astype(int)
+                flipped = nr != df["needs_review"]
+                now = _utc_now()
+                update_txns(WS_DIR, {
+                    _id: {"needs_review": int(v), "updated_at": now}
+                    for _id, v in zip(df.loc[flipped, "id"], nr[flipped])
+                })
                 st.success("Recomputed ✅")
                 st.rerun()
 
         st.divider()
 
-        for r in review.head(200).to_dict(orient="records"):
-            with st.container(border=True):
-                c1, c2, c3 = st.columns([2, 2, 1])
-
-                with c1:
-                    st.markdown(f"**{r.get('vendor','(missing vendor)') or '(missing vendor)'}**")
-                    st.caption(f"ID: {r['id']} • Confidence: {float(r.get('confidence') or 0):.2f}")
-                    st.write(f"Date: `{r.get('date','')}`  |  Amount: **${float(r.get('amount') or 0):.2f}**")
-                    st.write(f"Category: `{r.get('category','Other')}`  |  Account: `{r.get('account_code','')}`")
-
-                    receipt_path = (r.get("receipt_path") or "").strip()
-                    p = WS_DIR / receipt_path if receipt_path else None
-                    if p and p.exists():
-                        with st.expander("Show receipt image"):
-                            st.image(str(p), use_container_width=True)
-
-                with c2:
-                    new_vendor = st.text_input("Vendor", value=r.get("vendor", ""), key=f"rv_{r['id']}")
-                    new_date = st.text_input("Date", value=r.get("date", ""), key=f"rd_{r['id']}")
-                    new_amount = st.number_input(
-                        "Amount",
-                        min_value=0.0,
-                        value=float(r.get("amount") or 0),
-                        step=0.01,
-                        key=f"ra_{r['id']}",
-                    )
-
-                    new_cat = st.selectbox(
-                        "Category",
-                        options=list(COA.keys()),
-                        index=list(COA.keys()).index(r.get("category", "Other"))
-                        if r.get("category", "Other") in COA
-                        else list(COA.keys()).index("Other"),
-                        key=f"rc_{r['id']}",
-                    )
-                    code, _ = coa_for_category(new_cat)
-
-                    known_jobs = get_known_jobs(MEM)
-                    new_job_pick = st.selectbox("Job", [""] + known_jobs, index=0, key=f"rjpick_{r['id']}")
-                    if new_job_pick == "":
-                        new_job = st.text_input("Or type job", value=r.get("job", ""), key=f"rj_{r['id']}")
-                    else:
-                        new_job = new_job_pick
-
-                    new_notes = st.text_input("Notes", value=r.get("notes", ""), key=f"rn_{r['id']}")
-
-                with c3:
-                    if st.button("Approve", type="primary", key=f"ap_{r['id']}"):
-                        update_txn(
-                            WS_DIR,
-                            r["id"],
-                            {
-                                "vendor": new_vendor,
-                                "date": new_date,
-                                "amount": float(new_amount),
-                                "category": new_cat,
-                                "account_code": code,
-                                "job": new_job,
-                                "notes": new_notes,
-                                "approved_at": _utc_now(),
-                                "confidence": max(float(r.get("confidence") or 0), 0.90),
-                                "needs_review": 0,
-                                "updated_at": _utc_now(),
-                            },
-                        )
-
-                        if new_job:
-                            remember_job(MEM, new_job)
-                        remember_vendor_mapping(MEM, vendor=new_vendor, category=new_cat, account_code=code)
-                        save_memory(WS_DIR, MEM)
-
-                        st.success("Approved ✅")
-                        st.rerun()
+        if not st.toggle("Card view (with receipt images)", value=False, key="review_card_view"):
+            _review_grid(review)
+        else:
+            n_pages = max(1, -(-len(review) // REVIEW_PAGE_SIZE))
+            page = min(int(st.session_state.get("review_page", 0)), n_pages - 1)
+            st.session_state["review_page"] = page
+
+            pg1, pg2, pg3 = st.columns([1, 2, 1])
+            with pg1:
+                if st.button("◀ Prev", disabled=page == 0, key="review_prev"):
+                    st.session_state["review_page"] = page - 1
+                    st.rerun()
+            with pg2:
+                st.caption(f"Page {page + 1} of {n_pages} • {len(review)} receipts need review")
+            with pg3:
+                if st.button("Next ▶", disabled=page >= n_pages - 1, key="review_next"):
+                    st.session_state["review_page"] = page + 1
+                    st.rerun()
 
-                    if st.button("Delete", key=f"del_{r['id']}"):
-                        soft_delete_txn(WS_DIR, r["id"])
-                        st.warning("Moved to Recently deleted 🗑️")
-                        st.rerun()
+            start = page * REVIEW_PAGE_SIZE
+            page_rows = review.iloc[start:start + REVIEW_PAGE_SIZE][REVIEW_CARD_FIELDS]
+            for r in page_rows.itertuples(index=False):
+                _review_card(r)
 
 # ==========================================================
 # 3) BROWSE
@@ -542,64 +736,58 @@ with tab_review:
 with tab_browse:
     st.header("Browse receipts")
 
-    rows = list_txns(WS_DIR, include_deleted=False)
-    df = _make_df(rows)
+    df = DF
 
     if df.empty:
         st.info("No receipts yet.")
     else:
-        jobs = sorted([j for j in df["job"].fillna("").unique().tolist() if str(j).strip()])
-        vendors = sorted([v for v in df["vendor"].fillna("").unique().tolist() if str(v).strip()])
-        cats = sorted(df["category"].fillna("Other").unique().tolist())
-
-        f1, f2, f3, f4, f5 = st.columns([1, 1, 1, 1, 1])
-        with f1:
-            job_pick = st.selectbox("Job", ["All"] + jobs)
-        with f2:
-            vendor_pick = st.selectbox("Vendor", ["All"] + vendors)
-        with f3:
-            cat_pick = st.selectbox("Category", ["All"] + cats)
-        with f4:
-            min_conf = st.slider("Min confidence", 0.0, 1.0, 0.0, 0.05)
-        with f5:
-            only_review = st.toggle("Needs review only", value=False)
-
-        q = st.text_input("Search (vendor/notes/job/category)", value="").strip().lower()
-
-        view = df.copy()
+        jobs = [j for j in df["job"].cat.categories if j.strip()]
+        vendors = [v for v in df["vendor"].cat.categories if v.strip()]
+        cats = df["category"].cat.categories.tolist()
+
+        # In a form, typing in Search or moving the slider doesn't rerun the page until Apply/Enter
+        with st.form("browse_filters", clear_on_submit=False, border=False):
+            f1, f2, f3, f4, f5 = st.columns([1, 1, 1, 1, 1])
+            with f1:
+                job_pick = st.selectbox("Job", ["All"] + jobs)
+            with f2:
+                vendor_pick = st.selectbox("Vendor", ["All"] + vendors)
+            with f3:
+                cat_pick = st.selectbox("Category", ["All"] + cats)
+            with f4:
+                min_conf = st.slider("Min confidence", 0.0, 1.0, 0.0, 0.05)
+            with f5:
+                only_review = st.toggle("Needs review only", value=False)
+
+            q = st.text_input("Search (vendor/notes/job/category)", value="").strip().lower()
+            st.form_submit_button("Apply filters")
+
+        # AND every active predicate into one mask, then gather the rows once. DF is already
+        # newest-first (storage sorts on date, created_at) and masking keeps that order.
+        masks = [df["confidence"].to_numpy() >= min_conf]
         if job_pick != "All":
-            view = view[view["job"] == job_pick]
+            masks.append((df["job"] == job_pick).to_numpy())
         if vendor_pick != "All":
-            view = view[view["vendor"] == vendor_pick]
+            masks.append((df["vendor"] == vendor_pick).to_numpy())
         if cat_pick != "All":
-            view = view[view["category"] == cat_pick]
-        view = view[view["confidence"] >= min_conf]
+            masks.append((df["category"] == cat_pick).to_numpy())
         if only_review:
-            view = view[view["needs_review"] == 1]
+            masks.append(df["needs_review"].to_numpy() == 1)
+        view = df[np.logical_and.reduce(masks)]
 
         if q:
-            def _hit(r):
-                blob = " ".join([
-                    str(r.get("vendor", "")),
-                    str(r.get("notes", "")),
-                    str(r.get("job", "")),
-                    str(r.get("category", "")),
-                ]).lower()
-                return q in blob
-            view = view[view.apply(_hit, axis=1)]
+            # str.cat rather than +, which categorical columns don't support
+            blob = view["vendor"].str.cat([view["notes"], view["job"], view["category"]], sep=" ").str.lower()
+            view = view[blob.str.contains(q, regex=False)]
 
         st.caption(f"{len(view)} receipts shown")
 
         show_cols = ["id", "date", "vendor", "amount", "category", "account_code", "job", "confidence", "needs_review"]
 
-        sort_cols = [c for c in ["date", "created_at"] if c in view.columns]
-        if sort_cols:
-            view = view.sort_values(by=sort_cols, ascending=[False] * len(sort_cols), na_position="last")
-
         left, right = st.columns([1.2, 0.8], gap="large")
 
         with left:
-            st.dataframe(view[show_cols], use_container_width=True, hide_index=True)
+            st.dataframe(view[show_cols], use_container_width=True, hide_index=True, column_config=TABLE_COLUMN_CONFIG)
             selected_id = st.text_input(
                 "Open receipt by ID (copy from table)",
                 value=st.session_state.get("selected_id", "")
@@ -612,15 +800,16 @@ with tab_browse:
             if not sel:
                 st.info("Paste an ID to view/edit.")
             else:
-                rec_map = {str(r["id"]): r for r in rows}
-                r = rec_map.get(str(sel))
+                hit = DF.loc[DF["id"] == sel]
+                r = hit.iloc[0].to_dict() if not hit.empty else None
                 if not r:
                     st.warning("ID not found (or deleted).")
                 else:
                     receipt_path = (r.get("receipt_path") or "").strip()
                     p = WS_DIR / receipt_path if receipt_path else None
-                    if p and p.exists():
-                        st.image(str(p), use_container_width=True)
+                    thumb = _receipt_thumb(str(p), p.stat().st_mtime_ns) if p and p.exists() else None
+                    if thumb is not None:
+                        st.image(thumb, use_container_width=True)
                     else:
                         st.caption("Receipt image not found.")
 
@@ -630,15 +819,14 @@ with tab_browse:
 
                     ec = st.selectbox(
                         "Category",
-                        options=list(COA.keys()),
-                        index=list(COA.keys()).index(r.get("category", "Other")) if r.get("category", "Other") in COA else list(COA.keys()).index("Other"),
+                        options=COA_KEYS,
+                        index=COA_INDEX.get(r.get("category", "Other"), COA_INDEX["Other"]),
                         key=f"ec_{sel}",
                     )
                     code, _ = coa_for_category(ec)
                     st.caption(f"Account: **{code}**")
 
-                    known_jobs = get_known_jobs(MEM)
-                    ej_pick = st.selectbox("Job", [""] + known_jobs, index=0, key=f"ejpick_{sel}")
+                    ej_pick = st.selectbox("Job", JOB_OPTIONS, index=0, key=f"ejpick_{sel}")
                     if ej_pick == "":
                         ej = st.text_input("Or type job", value=r.get("job", ""), key=f"ej_{sel}")
                     else:
@@ -684,14 +872,17 @@ with tab_browse:
 with tab_reports:
     st.header("Reports")
 
-    rows = list_txns(WS_DIR, include_deleted=False)
-    df = _make_df(rows)
+    df = DF
 
     if df.empty:
         st.info("No receipts yet.")
     else:
-        df["month"] = df["date"].astype(str).str.slice(0, 7)
-        pnl = df.pivot_table(index="month", columns="category", values="amount", aggfunc="sum", fill_value=0).sort_index()
+        pnl = (
+            df.groupby(["month", "category"], observed=True)["amount"]
+            .sum()
+            .unstack(fill_value=0)
+            .sort_index()
+        )
 
         st.subheader("Monthly expense summary (P&L-style)")
         st.dataframe(pnl, use_container_width=True)
@@ -712,9 +903,7 @@ with tab_export:
     st.write("Build a CSV + receipt ZIP organized by month/category.")
 
     if st.button("Build Accountant Pack", type="primary"):
-        csv_bytes, zip_bytes = build_accountant_pack(WS_DIR)
-        st.download_button("Download CSV", data=csv_bytes, file_name="bookiq_export.csv", mime="text/csv")
-        st.download_button("Download Receipts ZIP", data=zip_bytes, file_name="receipts.zip", mime="application/zip")
+        _pack_download_buttons()
 
 # ==========================================================
 # Recently deleted
@@ -722,16 +911,15 @@ with tab_export:
 with tab_deleted:
     st.header("Recently deleted")
 
-    deleted = list_txns(WS_DIR, include_deleted=True, only_deleted=True)
-    if not deleted:
+    ddf = _load_df(st.session_state["ws_code"], store_version(WS_DIR), only_deleted=True)
+    if ddf.empty:
         st.info("No deleted receipts.")
     else:
-        ddf = _make_df(deleted)
-
         st.dataframe(
             ddf[["id", "date", "vendor", "amount", "category", "job", "deleted_at"]],
             use_container_width=True,
-            hide_index=True
+            hide_index=True,
+            column_config=TABLE_COLUMN_CONFIG,
         )
 
         did = st.text_input("ID to restore/purge", value="").strip()
@@ -744,6 +932,9 @@ with tab_deleted:
         with c2:
             if st.button("Purge permanently") and did:
                 purge_deleted_txn(WS_DIR, did)
+                # Drop in-memory copies (OCR text, thumbnails, rows) along with the files
+                for _cache in (_upload_pipeline, _categorize_cached, _receipt_thumb, _load_rows, _load_df):
+                    _cache.clear()
                 st.warning("Purged permanently 🧨")
                 st.rerun()
 
@@ -62,11 +62,14 @@ TEXT_RULES: List[Tuple[re.Pattern, str, str]] = [
 # Example: avoid "Permits / Fees" when it’s clearly a retail receipt.
 ANTI_PERMITS_HINTS = re.compile(r"\b(visa|discover|mastercard|amex|subtotal|sales\s*tax|total)\b", re.I)
 
+NORM_STRIP_RE = re.compile(r"[^a-z0-9\s&./-]+")
+WHITESPACE_RE = re.compile(r"\s+")
+
 
 def _norm(s: str) -> str:
     s = (s or "").lower()
-    s = re.sub(r"[^a-z0-9\s&./-]+", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
+    s = NORM_STRIP_RE.sub(" ", s)
+    s = WHITESPACE_RE.sub(" ", s).strip()
     return s
 
 
@@ -21,6 +21,13 @@ def load_memory(ws_dir: Path) -> Dict:
 def save_memory(ws_dir: Path, mem: Dict) -> None:
     _path(ws_dir).write_text(json.dumps(mem, indent=2), encoding="utf-8")
 
+def memory_version(ws_dir: Path) -> int:
+    # mtime of memory.json (0 if missing): changes on every save_memory, cheap to use as a cache key
+    try:
+        return _path(ws_dir).stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
 def _norm_vendor(v: str) -> str:
     v = (v or "").strip().lower()
     v = "".join(ch for ch in v if ch.isalnum() or ch in [" ", "-"])
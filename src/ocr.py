@@ -1,11 +1,21 @@
 from __future__ import annotations
 
+import hashlib
+import json
 from io import BytesIO
+from pathlib import Path
 from typing import Tuple, Optional, List
 
-from PIL import Image, ImageOps, ImageEnhance, ImageFilter
+from PIL import Image, ImageChops, ImageOps, ImageEnhance, ImageFilter
 import pytesseract
 
+# Bump when preprocessing/OCR changes, so text cached by an older pipeline is redone
+OCR_CACHE_VERSION = 2
+PREVIEW_MAX_SIZE = (800, 1200)
+OCR_MAX_SIDE = 2000
+PREVIEW_JPEG_QUALITY = 80
+NO_TEXT_MESSAGE = "OCR ran but did not detect text. Try a clearer photo (closer, brighter, less glare)."
+
 
 def _score_text(t: str) -> float:
     if not t:
@@ -40,12 +50,20 @@ def _prep_variants(img: Image.Image) -> List[Image.Image]:
     v1 = ImageEnhance.Contrast(base).enhance(2.0)
     v1 = v1.filter(ImageFilter.UnsharpMask(radius=2, percent=180, threshold=3))
 
-    v2 = ImageEnhance.Contrast(base).enhance(2.6)
-    v2 = v2.point(lambda p: 255 if p > 165 else 0)
+    v2 = _adaptive_threshold(ImageOps.autocontrast(base, cutoff=1))
 
     return [v1, v2]
 
 
+def _adaptive_threshold(gray: Image.Image, radius: int = 15, offset: int = 10) -> Image.Image:
+    # Local-mean binarization (Pillow-only stand-in for cv2.adaptiveThreshold): a pixel is ink
+    # if it is more than `offset` darker than its Gaussian neighbourhood. Unlike a single global
+    # cutoff this survives shadows and uneven lighting across the receipt.
+    local_mean = gray.filter(ImageFilter.GaussianBlur(radius))
+    darker_by = ImageChops.subtract(local_mean, gray)  # clips at 0 where the pixel is lighter
+    return darker_by.point(lambda d: 0 if d > offset else 255)
+
+
 def _run_tesseract(im: Image.Image) -> str:
     configs = [
         "--oem 1 --psm 6",
@@ -70,6 +88,41 @@ def _run_tesseract(im: Image.Image) -> str:
     return best_text.strip()
 
 
+def _open_image(file_bytes: bytes) -> Optional[Image.Image]:
+    try:
+        img = Image.open(BytesIO(file_bytes))
+        # JPEGs can be decoded straight at 1/2..1/8 scale (never below the requested box)
+        img.draft("RGB", (OCR_MAX_SIDE, OCR_MAX_SIDE))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+    except Exception:
+        return None
+
+    # Phone photos are 12-48 MP; receipt text reads fine at ~2000px and Tesseract's cost
+    # scales with pixel count. thumbnail() keeps the aspect ratio and never upscales.
+    img.thumbnail((OCR_MAX_SIDE, OCR_MAX_SIDE), Image.LANCZOS)
+    return img
+
+
+def make_preview(img: Image.Image, max_size: Tuple[int, int] = PREVIEW_MAX_SIZE) -> bytes:
+    # Encoded once as JPEG; st.image would otherwise re-encode a PIL image to PNG on every rerun
+    thumb = img.copy()
+    thumb.thumbnail(max_size, Image.LANCZOS)
+    buf = BytesIO()
+    thumb.save(buf, format="JPEG", quality=PREVIEW_JPEG_QUALITY)
+    return buf.getvalue()
+
+
+def preview_from_file(path: Path, max_size: Tuple[int, int] = PREVIEW_MAX_SIZE) -> Optional[bytes]:
+    """JPEG thumbnail of a stored receipt, or None if it isn't a readable image (e.g. a PDF)."""
+    img = _open_image(Path(path).read_bytes())
+    return make_preview(img, max_size) if img is not None else None
+
+
+def file_digest(file_bytes: bytes) -> str:
+    # Same hash storage records as receipt_hash, so purging a receipt can find its cache entry
+    return hashlib.sha256(file_bytes).hexdigest()[:24]
+
+
 def ocr_upload(filename: str, file_bytes: bytes) -> Tuple[Optional[Image.Image], str]:
     name = (filename or "").lower()
 
@@ -80,18 +133,10 @@ def ocr_upload(filename: str, file_bytes: bytes) -> Tuple[Optional[Image.Image],
             "Please upload a photo (JPG or PNG) of the receipt."
         )
 
-    try:
-        img = Image.open(BytesIO(file_bytes))
-        img = ImageOps.exif_transpose(img).convert("RGB")
-    except Exception:
+    img = _open_image(file_bytes)
+    if img is None:
         return None, "Could not read image file."
 
-    # mild downscale only if enormous
-    max_side = max(img.size)
-    if max_side > 2600:
-        scale = 2600 / max_side
-        img = img.resize((int(img.size[0] * scale), int(img.size[1] * scale)), Image.LANCZOS)
-
     variants = _prep_variants(img)
 
     # rotations — but early stop once we hit a great score
@@ -116,8 +161,42 @@ def ocr_upload(filename: str, file_bytes: bytes) -> Tuple[Optional[Image.Image],
 
     best_text = (best_text or "").strip()
     if not best_text:
-        return img, "OCR ran but did not detect text. Try a clearer photo (closer, brighter, less glare)."
+        return img, NO_TEXT_MESSAGE
 
     return img, best_text
 
 
+def ocr_upload_cached(
+    filename: str,
+    file_bytes: bytes,
+    cache_dir: Path,
+    digest: Optional[str] = None,
+) -> Tuple[Optional[Image.Image], str]:
+    """
+    Same as ocr_upload, but remembers the OCR text on disk by file-content hash.
+    Re-uploading the same receipt only decodes the image (for the preview)
+    instead of running Tesseract again. Only text that was actually detected is
+    cached, so a failed or missing Tesseract doesn't stick for that file.
+    """
+    if (filename or "").lower().endswith(".pdf"):
+        return ocr_upload(filename, file_bytes)
+
+    digest = digest or file_digest(file_bytes)
+    p = cache_dir / f"v{OCR_CACHE_VERSION}-{digest}.json"
+    if p.exists():
+        try:
+            raw_text = json.loads(p.read_text(encoding="utf-8"))["raw_text"]
+            img = _open_image(file_bytes)
+            if img is not None:
+                return img, raw_text
+        except Exception:
+            pass
+
+    img, raw_text = ocr_upload(filename, file_bytes)
+    if img is not None and raw_text != NO_TEXT_MESSAGE:
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            p.write_text(json.dumps({"raw_text": raw_text}), encoding="utf-8")
+        except Exception:
+            pass
+    return img, raw_text
@@ -13,6 +13,11 @@ DATE_MDY_RE = re.compile(r"\b(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})\b")
 DATE_DOT_RE = re.compile(r"\b(\d{1,2})[.](\d{1,2})[.](\d{2,4})\b")
 TIME_RE = re.compile(r"\b(\d{1,2}:\d{2})(?::\d{2})?\s*([AP]M)?\b", re.I)
 
+WHITESPACE_RE = re.compile(r"\s+")
+NORM_STRIP_RE = re.compile(r"[^a-z0-9 #&/.:@,$-]+")
+STREET_NUMBER_RE = re.compile(r"^\d{1,6}\s+[A-Za-z]")
+COMMA_CENTS_RE = re.compile(r"\d+,\d{2}$")
+
 MONTH_NAME_RE = re.compile(
     r"\b(JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|SEPT|OCT|NOV|DEC)[A-Z]*\s+(\d{1,2}),?\s+(20\d{2})\b",
     re.I,
@@ -80,13 +85,13 @@ MERCHANT_BOOST = [
 
 def _clean_line(s: str) -> str:
     s = (s or "").strip()
-    s = re.sub(r"\s+", " ", s)
+    s = WHITESPACE_RE.sub(" ", s)
     return s
 
 def _norm(s: str) -> str:
     s = (s or "").lower()
-    s = re.sub(r"[^a-z0-9 #&/.:@,$-]+", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
+    s = NORM_STRIP_RE.sub(" ", s)
+    s = WHITESPACE_RE.sub(" ", s).strip()
     return s
 
 def _has_date_or_time(line: str) -> bool:
@@ -104,7 +109,7 @@ def _looks_like_address(line: str) -> bool:
     toks = set(low.split())
     if len(toks & ADDRESS_HINTS) >= 1 and any(ch.isdigit() for ch in line):
         return True
-    if re.search(r"^\d{1,6}\s+[A-Za-z]", line):
+    if STREET_NUMBER_RE.search(line):
         return True
     return False
 
@@ -114,7 +119,7 @@ def _parse_money_val(token: str) -> Optional[float]:
         return None
 
     # normalize comma-decimal
-    if "," in tok and "." not in tok and re.search(r"\d+,\d{2}$", tok):
+    if "," in tok and "." not in tok and COMMA_CENTS_RE.search(tok):
         tok = tok.replace(",", ".")
     else:
         tok = tok.replace(",", "")
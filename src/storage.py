@@ -6,9 +6,13 @@ import uuid
 import hashlib
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
 
 TRANSACTIONS_CSV = "transactions.csv"
+OCR_CACHE_DIR = "ocr_cache"
+RECEIPT_CHUNK_SIZE = 1024 * 1024
+# Below this categorizer confidence a receipt is flagged "Needs review" (the app uses it too)
+NEEDS_REVIEW_MIN_CONFIDENCE = 0.75
 
 
 def _now() -> str:
@@ -50,39 +54,45 @@ def ensure_store(ws_dir: Path) -> None:
         return
     ws_dir.mkdir(parents=True, exist_ok=True)
     with p.open("w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=_fieldnames())
+        w = csv.DictWriter(f, fieldnames=_FIELDNAMES)
         w.writeheader()
 
 
-def _backfill_row(row: Dict) -> Dict:
-    # ✅ Backfill missing keys so older CSV rows never break the app
-    for k in _fieldnames():
-        row.setdefault(k, "")
+# Built once; _backfill_row runs for every CSV row on every read
+_FIELDNAMES = _fieldnames()
 
-    # Normalize numeric fields
+
+def _to_float(x, default: float = 0.0) -> float:
     try:
-        row["amount"] = float(row.get("amount") or 0)
+        return float(x or 0)
     except Exception:
-        row["amount"] = 0.0
+        return default
 
+
+def _to_int(x, default: int = 0) -> int:
     try:
-        row["confidence"] = float(row.get("confidence") or 0)
+        return int(float(x))
     except Exception:
-        row["confidence"] = 0.0
+        return default
 
-    # Normalize int-ish flags
-    def _to_int(x, default=0):
-        try:
-            return int(float(x))
-        except Exception:
-            return default
 
-    row["needs_review"] = _to_int(row.get("needs_review"), 0)
-    row["deleted"] = _to_int(row.get("deleted"), 0)
+def _backfill_row(row: Dict) -> Dict:
+    # ✅ Backfill missing keys so older CSV rows never break the app
+    setdefault = row.setdefault
+    for k in _FIELDNAMES:
+        setdefault(k, "")
+
+    # Normalize numeric fields
+    row["amount"] = _to_float(row["amount"])
+    row["confidence"] = _to_float(row["confidence"])
+
+    # Normalize int-ish flags
+    row["needs_review"] = _to_int(row["needs_review"])
+    row["deleted"] = _to_int(row["deleted"])
 
     # Ensure created_at exists for sorting
-    if not row.get("created_at"):
-        row["created_at"] = row.get("updated_at") or row.get("approved_at") or ""
+    if not row["created_at"]:
+        row["created_at"] = row["updated_at"] or row["approved_at"] or ""
 
     return row
 
@@ -91,33 +101,58 @@ def _read_all(ws_dir: Path) -> List[Dict]:
     ensure_store(ws_dir)
     p = _csv_path(ws_dir)
 
-    rows: List[Dict] = []
     with p.open("r", newline="", encoding="utf-8") as f:
-        r = csv.DictReader(f)
-        for row in r:
-            rows.append(_backfill_row(row))
+        rows: List[Dict] = [_backfill_row(row) for row in csv.DictReader(f)]
 
     # Sort newest first (created_at may be empty for very old rows, but won't crash)
     rows.sort(key=lambda x: (x.get("date", ""), x.get("created_at", "")), reverse=True)
     return rows
 
 
+def _csv_row(r: Dict) -> Dict:
+    rr = _backfill_row(dict(r))
+
+    # store as strings (_backfill_row already coerced the numerics)
+    rr["amount"] = f"{rr['amount']:.2f}"
+    rr["confidence"] = f"{rr['confidence']:.2f}"
+    rr["needs_review"] = str(rr["needs_review"])
+    rr["deleted"] = str(rr["deleted"])
+
+    return {k: rr[k] for k in _FIELDNAMES}
+
+
 def _write_all(ws_dir: Path, rows: List[Dict]) -> None:
     p = _csv_path(ws_dir)
     with p.open("w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=_fieldnames())
+        w = csv.DictWriter(f, fieldnames=_FIELDNAMES)
         w.writeheader()
-        for r in rows:
-            rr = dict(r)
-            rr = _backfill_row(rr)
+        w.writerows(_csv_row(r) for r in rows)
+
+
+def _append_row(ws_dir: Path, row: Dict) -> None:
+    # New rows go on the end of the file; only an older header layout forces a full rewrite
+    p = _csv_path(ws_dir)
+    with p.open("r", newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f), [])
+    if header != _FIELDNAMES:
+        rows = _read_all(ws_dir)
+        rows.append(row)
+        _write_all(ws_dir, rows)
+        return
+    with p.open("a", newline="", encoding="utf-8") as f:
+        csv.DictWriter(f, fieldnames=_FIELDNAMES).writerow(_csv_row(row))
 
-            # store as strings
-            rr["amount"] = f"{float(rr.get('amount') or 0):.2f}"
-            rr["confidence"] = f"{float(rr.get('confidence') or 0):.2f}"
-            rr["needs_review"] = str(int(rr.get("needs_review") or 0))
-            rr["deleted"] = str(int(rr.get("deleted") or 0))
 
-            w.writerow({k: rr.get(k, "") for k in _fieldnames()})
+def store_version(ws_dir: Path) -> Tuple[int, int]:
+    """
+    Cheap freshness token for the transactions file: (mtime_ns, size).
+    Changes on every write, so it can key st.cache_data without reading the CSV.
+    """
+    try:
+        st = _csv_path(ws_dir).stat()
+    except FileNotFoundError:
+        return (0, 0)
+    return (st.st_mtime_ns, st.st_size)
 
 
 def list_txns(ws_dir: Path, include_deleted: bool = False, only_deleted: bool = False) -> List[Dict]:
@@ -129,8 +164,18 @@ def list_txns(ws_dir: Path, include_deleted: bool = False, only_deleted: bool =
     return [r for r in rows if int(r.get("deleted") or 0) == 0]
 
 
-def _hash_bytes(b: bytes) -> str:
-    return hashlib.sha256(b).hexdigest()[:24]
+def _write_receipt(dest: Path, src: Union[bytes, BinaryIO]) -> str:
+    # Write the receipt and hash it in the same pass; file objects are streamed in chunks
+    h = hashlib.sha256()
+    with dest.open("wb") as f:
+        if isinstance(src, (bytes, bytearray, memoryview)):
+            h.update(src)
+            f.write(src)
+        else:
+            for chunk in iter(lambda: src.read(RECEIPT_CHUNK_SIZE), b""):
+                h.update(chunk)
+                f.write(chunk)
+    return h.hexdigest()[:24]
 
 
 def add_txn(
@@ -145,23 +190,24 @@ def add_txn(
     confidence_notes: str = "",
     job: str = "",
     notes: str = "",
-    receipt_bytes: bytes,
+    receipt_bytes: Union[bytes, BinaryIO],
     receipt_filename: str,
     group_id: str = "",
+    needs_review: Optional[int] = None,
 ) -> str:
     ensure_store(ws_dir)
 
     txn_id = uuid.uuid4().hex[:12]
     created_at = _now()
-    receipt_hash = _hash_bytes(receipt_bytes)
 
     safe_name = receipt_filename.replace("/", "_").replace("\\", "_")
     receipt_rel = f"receipts/{txn_id}_{safe_name}"
     receipt_abs = ws_dir / receipt_rel
     receipt_abs.parent.mkdir(parents=True, exist_ok=True)
-    receipt_abs.write_bytes(receipt_bytes)
+    receipt_hash = _write_receipt(receipt_abs, receipt_bytes)
 
-    needs_review = int(float(confidence) < 0.75 or not (vendor or "").strip() or not (date or "").strip() or float(amount) <= 0)
+    if needs_review is None:
+        needs_review = int(float(confidence) < NEEDS_REVIEW_MIN_CONFIDENCE or not (vendor or "").strip() or not (date or "").strip() or float(amount) <= 0)
 
     row = _backfill_row({
         "id": txn_id,
@@ -185,43 +231,58 @@ def add_txn(
         "deleted_at": "",
     })
 
-    rows = _read_all(ws_dir)
-    rows.append(row)
-    _write_all(ws_dir, rows)
+    _append_row(ws_dir, row)
     return txn_id
 
 
 def update_txn(ws_dir: Path, txn_id: str, patch: Dict) -> None:
-    rows = _read_all(ws_dir)
+    update_txns(ws_dir, {txn_id: patch})
 
-    for r in rows:
-        if r["id"] == txn_id:
-            r.update(patch)
-            r = _backfill_row(r)
 
-            # Recompute needs_review
-            conf = float(r.get("confidence") or 0)
-            amt = float(r.get("amount") or 0)
-            needs = int(conf < 0.75 or not r.get("vendor") or not r.get("date") or amt <= 0)
-            r["needs_review"] = needs
+def update_txns(ws_dir: Path, updates: Dict[str, Dict]) -> None:
+    """
+    Apply {txn_id: patch} for many rows with one read and one rewrite of the CSV.
+    """
+    if not updates:
+        return
+    rows = _read_all(ws_dir)
 
-            r["updated_at"] = _now()
-            # if created_at missing, fill it
-            if not r.get("created_at"):
-                r["created_at"] = r["updated_at"]
-            break
+    for r in rows:
+        patch = updates.get(r["id"])
+        if patch is None:
+            continue
+        r.update(patch)
+        r = _backfill_row(r)
+
+        # Recompute needs_review
+        conf = float(r.get("confidence") or 0)
+        amt = float(r.get("amount") or 0)
+        needs = int(conf < NEEDS_REVIEW_MIN_CONFIDENCE or not r.get("vendor") or not r.get("date") or amt <= 0)
+        r["needs_review"] = needs
+
+        r["updated_at"] = _now()
+        # if created_at missing, fill it
+        if not r.get("created_at"):
+            r["created_at"] = r["updated_at"]
 
     _write_all(ws_dir, rows)
 
 
 def soft_delete_txn(ws_dir: Path, txn_id: str) -> None:
+    soft_delete_txns(ws_dir, [txn_id])
+
+
+def soft_delete_txns(ws_dir: Path, txn_ids: List[str]) -> None:
+    ids = set(txn_ids)
+    if not ids:
+        return
     rows = _read_all(ws_dir)
+    now = _now()
     for r in rows:
-        if r["id"] == txn_id and int(r.get("deleted") or 0) == 0:
+        if r["id"] in ids and int(r.get("deleted") or 0) == 0:
             r["deleted"] = 1
-            r["deleted_at"] = _now()
-            r["updated_at"] = _now()
-            break
+            r["deleted_at"] = now
+            r["updated_at"] = now
     _write_all(ws_dir, rows)
 
 
@@ -247,6 +308,9 @@ def purge_deleted_txn(ws_dir: Path, txn_id: str) -> None:
         else:
             kept.append(r)
 
+    if len(kept) < len(rows):
+        _purge_ocr_cache(ws_dir, {r.get("receipt_hash") for r in kept})
+
     if to_delete_path:
         fpath = ws_dir / to_delete_path
         if fpath.exists():
@@ -258,25 +322,27 @@ def purge_deleted_txn(ws_dir: Path, txn_id: str) -> None:
     _write_all(ws_dir, kept)
 
 
-def build_accountant_pack(ws_dir: Path) -> Tuple[bytes, bytes]:
-    import zipfile
+def _purge_ocr_cache(ws_dir: Path, keep_hashes: set) -> None:
+    # Cached OCR text is named "v<N>-<receipt_hash>.json". Drop every entry no kept row points
+    # at: the purged receipt's, plus uploads that were OCR'd but never saved.
+    cache_dir = ws_dir / OCR_CACHE_DIR
+    if not cache_dir.is_dir():
+        return
+    for p in cache_dir.iterdir():
+        if p.stem.split("-", 1)[-1] in keep_hashes:
+            continue
+        try:
+            p.unlink()
+        except Exception:
+            pass
 
-    rows = list_txns(ws_dir, include_deleted=False)
 
-    out = io.StringIO()
-    out.write("Date,Vendor,Amount,Category,AccountCode,Job,Notes,ReceiptFilename,Confidence,ApprovedAt\n")
-    for r in rows:
-        receipt_fn = (r.get("receipt_path") or "").split("/")[-1]
-        out.write(
-            f"{r.get('date','')},{_csv_escape(r.get('vendor',''))},{float(r.get('amount') or 0):.2f},"
-            f"{_csv_escape(r.get('category',''))},{_csv_escape(r.get('account_code',''))},"
-            f"{_csv_escape(r.get('job',''))},{_csv_escape(r.get('notes',''))},"
-            f"{_csv_escape(receipt_fn)},{float(r.get('confidence') or 0):.2f},{_csv_escape(r.get('approved_at',''))}\n"
-        )
-    csv_bytes = out.getvalue().encode("utf-8")
-
-    zip_buf = io.BytesIO()
-    with zipfile.ZipFile(zip_buf, "w", compression=zipfile.ZIP_DEFLATED) as z:
+def _write_receipts_zip(ws_dir: Path, rows: List[Dict], target: Union[Path, BinaryIO]) -> None:
+    import zipfile
+
+    # JPEG/PNG/PDF receipts are already compressed; deflating them again only burns CPU.
+    # z.write() copies each receipt in chunks, so memory stays flat however big the pack is.
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_STORED) as z:
         for r in rows:
             rel = r.get("receipt_path") or ""
             src = ws_dir / rel
@@ -287,16 +353,39 @@ def build_accountant_pack(ws_dir: Path) -> Tuple[bytes, bytes]:
             dest = f"{month}/{cat}/{src.name}"
             z.write(src, dest)
 
-    return csv_bytes, zip_buf.getvalue()
-
 
-def build_monthly_pnl_csv(pnl_df) -> bytes:
-    return pnl_df.to_csv().encode("utf-8")
+def build_accountant_pack(ws_dir: Path, out: Optional[BinaryIO] = None) -> Tuple[bytes, BinaryIO]:
+    """
+    Returns (csv_bytes, zip_file). The receipt ZIP is written into `out` (an in-memory
+    buffer by default) and returned rewound.
+    """
+    rows = list_txns(ws_dir, include_deleted=False)
 
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    w.writerow(["Date", "Vendor", "Amount", "Category", "AccountCode", "Job", "Notes", "ReceiptFilename", "Confidence", "ApprovedAt"])
+    for r in rows:
+        receipt_fn = (r.get("receipt_path") or "").split("/")[-1]
+        w.writerow([
+            r.get("date", ""),
+            r.get("vendor", ""),
+            f"{float(r.get('amount') or 0):.2f}",
+            r.get("category", ""),
+            r.get("account_code", ""),
+            r.get("job", ""),
+            r.get("notes", ""),
+            receipt_fn,
+            f"{float(r.get('confidence') or 0):.2f}",
+            r.get("approved_at", ""),
+        ])
+    csv_bytes = buf.getvalue().encode("utf-8")
+
+    if out is None:
+        out = io.BytesIO()
+    _write_receipts_zip(ws_dir, rows, out)
+    out.seek(0)
+    return csv_bytes, out
 
-def _csv_escape(x: str) -> str:
-    x = str(x or "")
-    if any(c in x for c in [",", '"', "\n"]):
-        x = '"' + x.replace('"', '""') + '"'
-    return x
 
+def build_monthly_pnl_csv(pnl_df) -> bytes:
+    return pnl_df.to_csv().encode("utf-8")